@@ -0,0 +1,123 @@
+"""
+Active Orders Index Check
+
+Seeds a throwaway collection with ~1M finished orders plus a handful of live
+ones, then explains the kitchen query and checks that it is served by the
+restaurant_active_orders partial index without touching finished orders.
+
+Uses DATABASE_URL and writes to the "<DATABASE_NAME>_bench" database
+(override with BENCH_DATABASE_NAME). The collection is dropped afterwards.
+
+Run with:  python bench_active_orders.py [finished_orders] [active_orders]
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+from pymongo import ASCENDING, MongoClient
+
+from order_lifecycle import ACTIVE_ORDERS_INDEX, active_orders_filter, ensure_order_indexes
+
+load_dotenv()
+
+RESTAURANTS = 50
+INSERT_BATCH = 10_000
+
+
+def _order(restaurant_id: str, status: str, created_at: datetime) -> dict:
+    return {
+        "restaurant_id": restaurant_id,
+        "customer_name": "Bench",
+        "customer_phone": "000",
+        "dine_in_time": created_at.isoformat(),
+        "items": [{"menu_item_id": "bench", "quantity": 1}],
+        "total": 10.0,
+        "status": status,
+        "active": status not in ("served", "cancelled"),
+        "version": 0,
+        "status_history": [],
+        "created_at": created_at,
+        "updated_at": created_at,
+    }
+
+
+def _find_stage(plan: dict, stage: str):
+    """Depth-first search for a stage in an explain plan"""
+    if plan.get("stage") == stage:
+        return plan
+    for key in ("inputStage", "queryPlan"):
+        if isinstance(plan.get(key), dict):
+            found = _find_stage(plan[key], stage)
+            if found:
+                return found
+    for child in plan.get("inputStages", []):
+        found = _find_stage(child, stage)
+        if found:
+            return found
+    return None
+
+
+def seed(collection, finished: int, active: int):
+    start = datetime.now(timezone.utc) - timedelta(days=365)
+    batch = []
+    for i in range(finished):
+        status = "cancelled" if i % 20 == 0 else "served"
+        batch.append(_order(f"r{i % RESTAURANTS}", status, start + timedelta(seconds=i * 30)))
+        if len(batch) == INSERT_BATCH:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+    now = datetime.now(timezone.utc)
+    live = ["placed", "accepted", "preparing", "ready"]
+    collection.insert_many(
+        [_order("r0", live[i % len(live)], now - timedelta(minutes=i)) for i in range(active)]
+    )
+
+
+def main():
+    finished = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    active = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+
+    database_url = os.getenv("DATABASE_URL")
+    database_name = os.getenv("BENCH_DATABASE_NAME") or f"{os.getenv('DATABASE_NAME', 'app')}_bench"
+    if not database_url:
+        sys.exit("DATABASE_URL is not set")
+
+    collection = MongoClient(database_url)[database_name]["order_bench"]
+    collection.drop()
+    try:
+        t0 = time.monotonic()
+        seed(collection, finished, active)
+        ensure_order_indexes(collection)
+        print(f"Seeded {finished} finished + {active} active orders in {time.monotonic() - t0:.1f}s")
+
+        cursor = collection.find(active_orders_filter("r0")).sort("created_at", ASCENDING).limit(200)
+        explain = cursor.explain()
+        stats = explain["executionStats"]
+        winning = explain["queryPlanner"]["winningPlan"]
+        ixscan = _find_stage(winning, "IXSCAN")
+
+        print(f"Winning plan index: {ixscan.get('indexName') if ixscan else None}")
+        print(f"nReturned={stats['nReturned']} totalKeysExamined={stats['totalKeysExamined']} "
+              f"totalDocsExamined={stats['totalDocsExamined']} executionTimeMillis={stats['executionTimeMillis']}")
+
+        expected = min(active, 200)
+        ok = (
+            ixscan is not None
+            and ixscan.get("indexName") == ACTIVE_ORDERS_INDEX
+            and stats["nReturned"] == expected
+            and stats["totalDocsExamined"] == expected
+        )
+        print("PASS" if ok else "FAIL")
+        return 0 if ok else 1
+    finally:
+        collection.drop()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
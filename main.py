@@ -1,12 +1,23 @@
 import os
-from fastapi import FastAPI, HTTPException
+import logging
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from database import db, create_document, get_documents
-from schemas import Restaurant, MenuItem, Order, OrderItem
+from schemas import Restaurant, MenuItem, Order, OrderItem, OrderStatus
+from order_lifecycle import (
+    ensure_order_indexes, backfill_order_lifecycle, get_active_orders, transition_order,
+    InvalidTransition, OrderNotFound, VersionConflict,
+)
+from order_archive import (
+    ensure_archive_indexes, validate_archive_settings, acquire_archive_lease, archive_orders,
+    get_archive_status, find_order, list_orders_page,
+)
 from bson.objectid import ObjectId
 
+logger = logging.getLogger(__name__)
+
 app = FastAPI(title="Dine-In Preorder API")
 
 app.add_middleware(
@@ -17,6 +28,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.on_event("startup")
+def prepare_database():
+    # Keep the app bootable without a database; /test reports the problem
+    try:
+        ensure_order_indexes()
+        ensure_archive_indexes()
+        backfill_order_lifecycle()
+    except Exception as e:
+        logger.warning("Skipping index creation and order backfill: %s", str(e)[:200])
+
+
 # Utilities
 
 def serialize_doc(doc: dict):
@@ -244,14 +267,79 @@ def place_order(req: PlaceOrderRequest):
 
 
 @app.get("/orders")
-def list_orders(restaurant_id: Optional[str] = None, limit: int = 50):
+def list_orders(
+    restaurant_id: Optional[str] = None,
+    limit: int = Query(50, ge=0),
+    before: Optional[str] = None,
+    include_archived: bool = True,
+):
+    # Newest first, archived orders included; limit=0 returns everything.
+    # Pass the last id of a page as `before` to get the next one.
+    if before is not None and not ObjectId.is_valid(before):
+        raise HTTPException(status_code=400, detail="Invalid 'before' order id")
     filt = {"restaurant_id": restaurant_id} if restaurant_id else {}
-    docs = get_documents("order", filt, limit)
-    for d in docs:
-        d = serialize_doc(d)
+    docs = list_orders_page(filt, limit, before, include_archived)
     return [serialize_doc(d) for d in docs]
 
 
+@app.get("/orders/{order_id}")
+def get_order(order_id: str):
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(status_code=404, detail="Order not found")
+    doc = find_order(order_id)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    return serialize_doc(doc)
+
+
+@app.get("/restaurants/{restaurant_id}/orders/active")
+def list_active_orders(restaurant_id: str, limit: int = Query(200, ge=1, le=1000)):
+    docs = get_active_orders(restaurant_id, limit)
+    return [serialize_doc(d) for d in docs]
+
+
+class UpdateOrderStatusRequest(BaseModel):
+    status: OrderStatus
+    expected_version: Optional[int] = None
+
+
+@app.patch("/orders/{order_id}/status")
+def update_order_status(order_id: str, req: UpdateOrderStatusRequest):
+    if not ObjectId.is_valid(order_id):
+        raise HTTPException(status_code=404, detail="Order not found")
+    try:
+        doc = transition_order(order_id, req.status, req.expected_version)
+    except OrderNotFound:
+        raise HTTPException(status_code=404, detail="Order not found")
+    except InvalidTransition as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except VersionConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return serialize_doc(doc)
+
+
+# Archival
+@app.post("/admin/archive/orders")
+def run_order_archival(background_tasks: BackgroundTasks, older_than_days: Optional[int] = Query(None, ge=1)):
+    if db is None:
+        raise HTTPException(status_code=500, detail="Database not configured")
+    kwargs = {"older_than_days": older_than_days} if older_than_days is not None else {}
+    try:
+        validate_archive_settings(**kwargs)
+    except ValueError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    lease_id = acquire_archive_lease()
+    if lease_id is None:
+        raise HTTPException(status_code=409, detail="Archival already running")
+    background_tasks.add_task(archive_orders, lease_id=lease_id, **kwargs)
+    return {"status": "scheduled"}
+
+
+@app.get("/admin/archive/orders")
+def order_archival_status():
+    return get_archive_status()
+
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.getenv("PORT", 8000))
@@ -0,0 +1,359 @@
+"""
+Order Archival
+
+Moves old, finished orders out of the hot "order" collection so its indexes
+stay small. Orders go either to the "order_archive" collection or to
+gzip-compressed NDJSON files on local disk, one per batch and month:
+ARCHIVE_DIR/YYYY-MM/<first id>-<last id>.ndjson.gz. Each file is written to a
+temporary name and renamed into place, so a crash never leaves a partial file,
+and the id range in the name lets lookups open only the files that can hold an id.
+
+The job works in bounded batches and pauses between them. Only one run can
+hold the lease in "archive_state" at a time. Each batch's ids are checkpointed
+before they are written, so an interrupted run is finished by the next one
+without losing or duplicating orders.
+
+Lookups by id fall back to both archive targets. Listing only reaches into the
+archive collection; the file target supports id lookups only.
+
+Run manually with:  python order_archive.py
+"""
+
+import gzip
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from uuid import uuid4
+
+import bson
+from bson import json_util
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReplaceOne
+from pymongo.errors import DuplicateKeyError
+
+from database import db
+from order_lifecycle import ORDER_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_COLLECTION = "order_archive"
+STATE_COLLECTION = "archive_state"
+STATE_ID = "order"
+
+ARCHIVE_TARGET = os.getenv("ARCHIVE_TARGET", "collection")  # "collection" or "files"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", 90))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 500))
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", 0.5))
+# A lease not renewed for this long is assumed to belong to a dead run
+ARCHIVE_LEASE_SECONDS = int(os.getenv("ARCHIVE_LEASE_SECONDS", 600))
+
+
+class ArchiveAlreadyRunning(Exception):
+    """Another archival run holds the lease"""
+
+
+def ensure_archive_indexes():
+    """Create indexes used by the archival job and archive lookups"""
+    if db is None:
+        return
+    # Lets each batch read the oldest finished orders without scanning the collection
+    db[ORDER_COLLECTION].create_index(
+        [("created_at", ASCENDING)],
+        name="archivable_orders",
+        partialFilterExpression={"active": False},
+    )
+    # Newest-first paging for list_orders on both sides of the archive
+    db[ORDER_COLLECTION].create_index([("restaurant_id", ASCENDING), ("_id", DESCENDING)])
+    db[ARCHIVE_COLLECTION].create_index([("restaurant_id", ASCENDING), ("_id", DESCENDING)])
+
+
+def _archive_month_dir(oid: ObjectId) -> str:
+    # Bucketed by the _id timestamp so a lookup by id knows which month to open
+    return os.path.join(ARCHIVE_DIR, f"{oid.generation_time:%Y-%m}")
+
+
+def _batch_files(ids: list) -> dict:
+    """Map each id of a batch to the file it is archived in.
+
+    The name depends only on the batch's ids, so replaying a checkpointed
+    batch targets the same files.
+    """
+    by_month = {}
+    for oid in ids:
+        by_month.setdefault(_archive_month_dir(oid), []).append(oid)
+    files = {}
+    for month_dir, month_ids in by_month.items():
+        path = os.path.join(month_dir, f"{min(month_ids)}-{max(month_ids)}.ndjson.gz")
+        for oid in month_ids:
+            files[oid] = path
+    return files
+
+
+def _write_to_collection(docs: list):
+    # Upserts keep a re-run of a partially archived batch idempotent
+    db[ARCHIVE_COLLECTION].bulk_write(
+        [ReplaceOne({"_id": d["_id"]}, d, upsert=True) for d in docs],
+        ordered=False,
+    )
+
+
+def _read_file(path: str):
+    """Yield the NDJSON lines of an archive file, stopping quietly if it is unreadable"""
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                yield line
+    except (OSError, EOFError, zlib.error) as e:
+        logger.warning("Skipping unreadable archive file %s: %s", path, e)
+
+
+def _write_to_files(docs: list, files: dict, skip_existing: bool = False):
+    by_file = {}
+    for d in docs:
+        by_file.setdefault(files[d["_id"]], []).append(d)
+    for path, group in by_file.items():
+        if skip_existing and os.path.exists(path):
+            # Renamed into place only once complete, so an existing file holds the whole group
+            continue
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+            for d in group:
+                f.write(json_util.dumps(d) + "\n")
+        os.replace(tmp_path, path)
+
+
+def _load_state() -> dict:
+    return db[STATE_COLLECTION].find_one({"_id": STATE_ID}) or {}
+
+
+def _save_state(**fields):
+    db[STATE_COLLECTION].update_one({"_id": STATE_ID}, {"$set": fields}, upsert=True)
+
+
+def acquire_archive_lease() -> Optional[str]:
+    """Take the archival lease, returning its id, or None if another run holds it"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    now = datetime.now(timezone.utc)
+    lease_id = uuid4().hex
+    try:
+        db[STATE_COLLECTION].find_one_and_update(
+            {
+                "_id": STATE_ID,
+                "$or": [
+                    {"running": {"$ne": True}},
+                    {"lease_at": {"$lt": now - timedelta(seconds=ARCHIVE_LEASE_SECONDS)}},
+                ],
+            },
+            {"$set": {"running": True, "lease_id": lease_id, "lease_at": now}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # The state document exists but the filter did not match: lease is held
+        return None
+    return lease_id
+
+
+def _renew_lease(lease_id: str):
+    result = db[STATE_COLLECTION].update_one(
+        {"_id": STATE_ID, "lease_id": lease_id},
+        {"$set": {"lease_at": datetime.now(timezone.utc)}},
+    )
+    if result.matched_count == 0:
+        raise ArchiveAlreadyRunning("Archival lease was taken over by another run")
+
+
+def _release_lease(lease_id: str):
+    db[STATE_COLLECTION].update_one(
+        {"_id": STATE_ID, "lease_id": lease_id},
+        {"$set": {"running": False}, "$unset": {"lease_id": "", "lease_at": ""}},
+    )
+
+
+def _move_batch(docs: list, target: str, eligible: dict, ids: Optional[list] = None, replay: bool = False) -> list:
+    """Archive a batch and remove it from the hot collection.
+
+    The ids are checkpointed before writing. A replayed batch passes the
+    checkpointed ids, which may include orders already deleted, so file names
+    match the interrupted run's and files that were completed are not rewritten.
+    """
+    ids = ids or [d["_id"] for d in docs]
+    _save_state(pending_ids=ids, pending_target=target)
+    if target == "collection":
+        _write_to_collection(docs)
+    else:
+        _write_to_files(docs, _batch_files(ids), skip_existing=replay)
+    # Only delete documents that still match what was archived
+    db[ORDER_COLLECTION].delete_many({"_id": {"$in": [d["_id"] for d in docs]}, **eligible})
+    _save_state(pending_ids=[], last_archived_id=str(ids[-1]))
+    return docs
+
+
+def validate_archive_settings(target: str = ARCHIVE_TARGET, older_than_days: int = ARCHIVE_AFTER_DAYS):
+    if target not in ("collection", "files"):
+        raise ValueError(f"Unknown archive target '{target}'")
+    if older_than_days < 1:
+        raise ValueError("older_than_days must be at least 1")
+
+
+def archive_orders(
+    older_than_days: int = ARCHIVE_AFTER_DAYS,
+    batch_size: int = ARCHIVE_BATCH_SIZE,
+    pause_seconds: float = ARCHIVE_PAUSE_SECONDS,
+    target: str = ARCHIVE_TARGET,
+    max_batches: Optional[int] = None,
+    lease_id: Optional[str] = None,
+) -> dict:
+    """Move finished orders older than the cutoff out of the hot collection.
+
+    Pass lease_id if the caller already took the lease with
+    acquire_archive_lease; otherwise it is acquired here, and
+    ArchiveAlreadyRunning is raised if another run holds it. The lease is
+    released when the run ends.
+
+    Returns a report with the number of documents and BSON bytes moved.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    if lease_id is None:
+        lease_id = acquire_archive_lease()
+        if lease_id is None:
+            raise ArchiveAlreadyRunning("An archival run is already in progress")
+
+    # Validate inside the try so a lease taken by the caller is always released
+    try:
+        validate_archive_settings(target, older_than_days)
+        return _run_archival(older_than_days, batch_size, pause_seconds, target, max_batches, lease_id)
+    finally:
+        _release_lease(lease_id)
+
+
+def _run_archival(older_than_days, batch_size, pause_seconds, target, max_batches, lease_id) -> dict:
+    cutoff = datetime.now(timezone.utc) - timedelta(days=older_than_days)
+    # Only finished orders are archived; live ones stay however old they are
+    eligible = {"created_at": {"$lt": cutoff}, "active": False}
+    report = {"documents": 0, "bytes": 0, "batches": 0, "target": target, "cutoff": cutoff}
+    started = time.monotonic()
+
+    def record(docs):
+        report["documents"] += len(docs)
+        report["bytes"] += sum(len(bson.encode(d)) for d in docs)
+        report["batches"] += 1
+
+    # Finish a batch an earlier run checkpointed but may not have completed.
+    # Its cutoff is unknown, so only the finished check is reapplied.
+    state = _load_state()
+    if state.get("pending_ids"):
+        pending = list(db[ORDER_COLLECTION].find({"_id": {"$in": state["pending_ids"]}, "active": False}))
+        if pending:
+            pending_target = state.get("pending_target", target)
+            record(_move_batch(pending, pending_target, {"active": False}, ids=state["pending_ids"], replay=True))
+        else:
+            _save_state(pending_ids=[])
+
+    while max_batches is None or report["batches"] < max_batches:
+        _renew_lease(lease_id)
+        docs = list(db[ORDER_COLLECTION].find(eligible).sort("created_at", ASCENDING).limit(batch_size))
+        if not docs:
+            break
+
+        record(_move_batch(docs, target, eligible))
+
+        if len(docs) < batch_size:
+            break
+        # Throttle so the job does not compete with peak traffic
+        time.sleep(pause_seconds)
+
+    report["seconds"] = round(time.monotonic() - started, 3)
+    _save_state(last_report=report, last_run_at=datetime.now(timezone.utc))
+    return report
+
+
+def get_archive_status() -> dict:
+    """Checkpoint and report of the most recent archival run"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    state = _load_state()
+    state.pop("_id", None)
+    state.pop("lease_id", None)
+    # ObjectIds are not JSON serialisable
+    state["pending_ids"] = [str(i) for i in state.get("pending_ids", [])]
+    if state.get("last_archived_id") is not None:
+        state["last_archived_id"] = str(state["last_archived_id"])
+    return state
+
+
+def _find_in_files(oid: ObjectId) -> Optional[dict]:
+    month_dir = _archive_month_dir(oid)
+    if not os.path.isdir(month_dir):
+        return None
+    needle = str(oid)
+    found = None
+    for name in sorted(os.listdir(month_dir)):
+        if not name.endswith(".ndjson.gz"):
+            continue
+        first, _, last = name[:-len(".ndjson.gz")].partition("-")
+        # Same-length lowercase hex compares like the ObjectIds themselves
+        if not first <= needle <= last:
+            continue
+        for line in _read_file(os.path.join(month_dir, name)):
+            # Cheap substring test before paying for a full JSON decode
+            if needle in line:
+                doc = json_util.loads(line)
+                if doc.get("_id") == oid:
+                    # Keep scanning: an order re-archived after changing mid-batch
+                    # has its newer copy in a later file
+                    found = doc
+    return found
+
+
+def find_order(order_id: str) -> Optional[dict]:
+    """Look up an order in the hot collection, falling back to the archive"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    oid = ObjectId(order_id)
+    doc = db[ORDER_COLLECTION].find_one({"_id": oid})
+    if doc is None:
+        doc = db[ARCHIVE_COLLECTION].find_one({"_id": oid})
+    if doc is None:
+        doc = _find_in_files(oid)
+    return doc
+
+
+def list_orders_page(
+    filter_dict: dict = None,
+    limit: int = 50,
+    before: Optional[str] = None,
+    include_archived: bool = True,
+) -> list:
+    """Orders newest first, merged with the archive collection.
+
+    A limit of 0 means no limit. Pass the id of the last order of a page as
+    before to get the next one. Orders archived to files are not listed; they
+    can only be fetched by id.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+    filt = dict(filter_dict or {})
+    if before:
+        filt["_id"] = {"$lt": ObjectId(before)}
+
+    docs = list(db[ORDER_COLLECTION].find(filt).sort("_id", DESCENDING).limit(limit))
+    if include_archived:
+        docs += list(db[ARCHIVE_COLLECTION].find(filt).sort("_id", DESCENDING).limit(limit))
+        # An order briefly present in both places during a batch is listed once
+        unique = {d["_id"]: d for d in reversed(docs)}
+        docs = sorted(unique.values(), key=lambda d: d["_id"], reverse=True)
+        if limit:
+            docs = docs[:limit]
+    return docs
+
+
+if __name__ == "__main__":
+    print(archive_orders())
@@ -0,0 +1,163 @@
+"""
+Order Lifecycle
+
+Status transitions for orders and the indexes backing kitchen queries.
+Each transition is a single find_one_and_update guarded by the order's
+current status and version, so concurrent updates cannot overwrite each other.
+"""
+
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+from database import db
+from schemas import OrderStatusChange
+
+ORDER_COLLECTION = "order"
+
+# Allowed next statuses for each status. Statuses with no entry are terminal.
+ORDER_TRANSITIONS = {
+    "placed": {"accepted", "cancelled"},
+    "accepted": {"preparing", "cancelled"},
+    "preparing": {"ready", "cancelled"},
+    "ready": {"served"},
+}
+
+TERMINAL_STATUSES = {"served", "cancelled"}
+
+ACTIVE_ORDERS_INDEX = "restaurant_active_orders"
+
+MIGRATION_COLLECTION = "migration"
+BACKFILL_MIGRATION_ID = "order_lifecycle_backfill"
+# Pre-lifecycle orders newer than this are still treated as live by the backfill
+BACKFILL_LIVE_HOURS = int(os.getenv("BACKFILL_LIVE_HOURS", 12))
+
+
+class InvalidTransition(Exception):
+    """The requested status is not reachable from the order's current status"""
+
+
+class OrderNotFound(Exception):
+    """No order exists with the given id"""
+
+
+class VersionConflict(Exception):
+    """The order changed since the caller last read it"""
+
+
+def active_orders_filter(restaurant_id: str) -> dict:
+    """Query for a restaurant's live orders.
+
+    It must include active=True so the partial index is eligible.
+    """
+    return {"restaurant_id": restaurant_id, "active": True}
+
+
+def ensure_order_indexes(collection=None):
+    """Create indexes used by order queries (safe to call repeatedly)"""
+    if collection is None:
+        if db is None:
+            return
+        collection = db[ORDER_COLLECTION]
+    # Partial index: only live orders are indexed, so kitchen views stay
+    # proportional to the number of open orders, not the restaurant's history.
+    collection.create_index(
+        [("restaurant_id", ASCENDING), ("created_at", ASCENDING)],
+        name=ACTIVE_ORDERS_INDEX,
+        partialFilterExpression={"active": True},
+    )
+
+
+def backfill_order_lifecycle():
+    """Give orders created before the lifecycle existed its fields.
+
+    Orders from the last BACKFILL_LIVE_HOURS become "placed" so they still
+    reach kitchen views; older ones become "served" so they stay out of the
+    active index and can be archived. A marker in the migration collection
+    makes later calls a no-op instead of another collection scan.
+
+    Returns the number of orders updated.
+    """
+    if db is None:
+        return 0
+    if db[MIGRATION_COLLECTION].find_one({"_id": BACKFILL_MIGRATION_ID}):
+        return 0
+
+    orders = db[ORDER_COLLECTION]
+    live_since = datetime.now(timezone.utc) - timedelta(hours=BACKFILL_LIVE_HOURS)
+    base = {"version": 0, "status_history": []}
+    live = orders.update_many(
+        {"active": {"$exists": False}, "created_at": {"$gte": live_since}},
+        {"$set": {**base, "status": "placed", "active": True}},
+    )
+    finished = orders.update_many(
+        {"active": {"$exists": False}},
+        {"$set": {**base, "status": "served", "active": False}},
+    )
+    db[MIGRATION_COLLECTION].update_one(
+        {"_id": BACKFILL_MIGRATION_ID},
+        {"$set": {"applied_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return live.modified_count + finished.modified_count
+
+
+def get_active_orders(restaurant_id: str, limit: int = 200):
+    """Non-terminal orders for a restaurant, oldest first"""
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    cursor = (
+        db[ORDER_COLLECTION]
+        .find(active_orders_filter(restaurant_id))
+        .sort("created_at", ASCENDING)
+        .limit(limit)
+    )
+    return list(cursor)
+
+
+def transition_order(order_id: str, to_status: str, expected_version: Optional[int] = None):
+    """Move an order to a new status and append the change to its log.
+
+    If expected_version is omitted the current version is read first; the
+    update is still rejected if another writer bumps it in between.
+    """
+    if db is None:
+        raise Exception("Database not available. Check DATABASE_URL and DATABASE_NAME environment variables.")
+
+    oid = ObjectId(order_id)
+    current = db[ORDER_COLLECTION].find_one({"_id": oid}, {"status": 1, "version": 1})
+    if current is None:
+        raise OrderNotFound(order_id)
+
+    # Orders created before the lifecycle and not yet backfilled have neither field
+    from_status = current.get("status", "placed")
+    version = current.get("version", 0)
+    if expected_version is not None and expected_version != version:
+        raise VersionConflict(f"Order is at version {version}, expected {expected_version}")
+    if to_status not in ORDER_TRANSITIONS.get(from_status, set()):
+        raise InvalidTransition(f"Cannot move order from '{from_status}' to '{to_status}'")
+
+    now = datetime.now(timezone.utc)
+    change = OrderStatusChange(from_status=from_status, to_status=to_status, version=version + 1, at=now)
+    guard = {
+        "_id": oid,
+        "status": current.get("status"),
+        "version": current.get("version"),
+    }
+    update = {
+        "$set": {
+            "status": to_status,
+            "active": to_status not in TERMINAL_STATUSES,
+            "version": version + 1,
+            "updated_at": now,
+        },
+        "$push": {"status_history": change.model_dump()},
+    }
+    doc = db[ORDER_COLLECTION].find_one_and_update(guard, update, return_document=ReturnDocument.AFTER)
+    if doc is None:
+        raise VersionConflict("Order was modified concurrently, re-read and retry")
+    return doc
@@ -8,7 +8,8 @@ Each Pydantic model maps to a MongoDB collection with the lowercased class name.
 """
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Literal
+from datetime import datetime
 
 class Restaurant(BaseModel):
     name: str = Field(..., description="Restaurant name")
@@ -30,6 +31,14 @@ class OrderItem(BaseModel):
     menu_item_id: str
     quantity: int = Field(1, ge=1)
 
+OrderStatus = Literal["placed", "accepted", "preparing", "ready", "served", "cancelled"]
+
+class OrderStatusChange(BaseModel):
+    from_status: Optional[str] = None
+    to_status: str
+    version: int = Field(..., ge=0, description="Order version after this change")
+    at: datetime
+
 class Order(BaseModel):
     restaurant_id: str
     customer_name: str
@@ -38,3 +47,7 @@ class Order(BaseModel):
     items: List[OrderItem]
     special_requests: Optional[str] = None
     total: Optional[float] = Field(None, ge=0)
+    status: OrderStatus = Field("placed", description="Lifecycle status")
+    active: bool = Field(True, description="True while the order is in a non-terminal status")
+    version: int = Field(0, ge=0, description="Optimistic concurrency counter, bumped on every status change")
+    status_history: List[OrderStatusChange] = Field(default_factory=list, description="Transition log")
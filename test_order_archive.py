@@ -0,0 +1,120 @@
+import gzip
+import os
+from unittest.mock import MagicMock
+
+import pytest
+from bson import json_util
+from bson.objectid import ObjectId
+from fastapi.encoders import jsonable_encoder
+
+import order_archive
+from order_archive import (
+    ARCHIVE_COLLECTION, STATE_COLLECTION, _batch_files, _find_in_files, _run_archival,
+    _write_to_files, archive_orders, get_archive_status, list_orders_page,
+)
+from order_lifecycle import ORDER_COLLECTION
+
+
+@pytest.fixture
+def collections(monkeypatch, tmp_path):
+    cols = {ORDER_COLLECTION: MagicMock(), ARCHIVE_COLLECTION: MagicMock(), STATE_COLLECTION: MagicMock()}
+    monkeypatch.setattr(order_archive, "db", cols)
+    monkeypatch.setattr(order_archive, "ARCHIVE_DIR", str(tmp_path))
+    return cols
+
+
+def _orders(n):
+    return [{"_id": ObjectId(), "status": "served", "active": False} for _ in range(n)]
+
+
+def _archived_ids(root):
+    ids = []
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            with gzip.open(os.path.join(dirpath, name), "rt", encoding="utf-8") as f:
+                ids += [json_util.loads(line)["_id"] for line in f]
+    return ids
+
+
+def _replay(collections, pending_ids, refetched):
+    collections[STATE_COLLECTION].find_one.return_value = {"pending_ids": pending_ids, "pending_target": "files"}
+    # First find is the replay refetch, the second the (empty) next batch
+    collections[ORDER_COLLECTION].find.side_effect = [refetched, MagicMock()]
+    return _run_archival(90, 500, 0, "files", None, "lease")
+
+
+def test_replay_does_not_rewrite_completed_files(collections, tmp_path):
+    docs = _orders(3)
+    ids = [d["_id"] for d in docs]
+    # The interrupted run wrote the file and deleted one order before dying
+    _write_to_files(docs, _batch_files(ids))
+
+    report = _replay(collections, ids, docs[1:])
+
+    assert sorted(_archived_ids(tmp_path)) == sorted(ids)
+    assert report["documents"] == 2
+    deleted = collections[ORDER_COLLECTION].delete_many.call_args.args[0]
+    assert deleted == {"_id": {"$in": ids[1:]}, "active": False}
+
+
+def test_replay_writes_batch_that_never_reached_disk(collections, tmp_path):
+    docs = _orders(3)
+    ids = [d["_id"] for d in docs]
+
+    _replay(collections, ids, docs)
+
+    assert sorted(_archived_ids(tmp_path)) == sorted(ids)
+    assert not [n for _, _, names in os.walk(tmp_path) for n in names if n.endswith(".tmp")]
+
+
+def test_unreadable_file_is_skipped(collections, tmp_path):
+    docs = _orders(2)
+    files = _batch_files([d["_id"] for d in docs])
+    _write_to_files(docs, files)
+    path = files[docs[0]["_id"]]
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) // 2)
+
+    assert _find_in_files(docs[0]["_id"]) is None
+
+
+def test_lookup_only_opens_files_whose_range_holds_the_id(collections, monkeypatch):
+    docs = _orders(2)
+    _write_to_files(docs, _batch_files([d["_id"] for d in docs]))
+    assert _find_in_files(docs[1]["_id"])["_id"] == docs[1]["_id"]
+
+    opened = MagicMock(side_effect=AssertionError("file should not be opened"))
+    monkeypatch.setattr(order_archive.gzip, "open", opened)
+    assert _find_in_files(ObjectId()) is None
+
+
+def test_invalid_settings_release_a_caller_held_lease(collections):
+    with pytest.raises(ValueError):
+        archive_orders(target="s3", lease_id="lease")
+    released = collections[STATE_COLLECTION].update_one.call_args.args
+    assert released[0] == {"_id": order_archive.STATE_ID, "lease_id": "lease"}
+    assert released[1]["$set"] == {"running": False}
+
+
+def test_archive_status_is_json_serialisable(collections):
+    collections[STATE_COLLECTION].find_one.return_value = {
+        "_id": order_archive.STATE_ID,
+        "pending_ids": [ObjectId()],
+        "last_archived_id": ObjectId(),
+        "last_report": {"documents": 3, "bytes": 900},
+    }
+    status = jsonable_encoder(get_archive_status())
+    assert status["last_report"] == {"documents": 3, "bytes": 900}
+    assert all(isinstance(i, str) for i in status["pending_ids"])
+
+
+def test_list_orders_page_merges_archive_newest_first(collections):
+    old, mid, new = sorted(ObjectId() for _ in range(3))
+    hot = [{"_id": new, "where": "hot"}, {"_id": mid, "where": "hot"}]
+    archived = [{"_id": mid, "where": "archive"}, {"_id": old, "where": "archive"}]
+    collections[ORDER_COLLECTION].find.return_value.sort.return_value.limit.return_value = hot
+    collections[ARCHIVE_COLLECTION].find.return_value.sort.return_value.limit.return_value = archived
+
+    docs = list_orders_page({}, limit=0)
+
+    assert [(d["_id"], d["where"]) for d in docs] == [(new, "hot"), (mid, "hot"), (old, "archive")]
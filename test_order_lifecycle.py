@@ -0,0 +1,141 @@
+from unittest.mock import MagicMock
+
+import pytest
+from bson.objectid import ObjectId
+from fastapi import HTTPException
+
+import main
+import order_lifecycle
+from order_lifecycle import (
+    ORDER_COLLECTION, ORDER_TRANSITIONS, TERMINAL_STATUSES,
+    InvalidTransition, OrderNotFound, VersionConflict, transition_order,
+)
+
+
+@pytest.fixture
+def orders(monkeypatch):
+    collection = MagicMock()
+    monkeypatch.setattr(order_lifecycle, "db", {ORDER_COLLECTION: collection})
+    return collection
+
+
+def test_terminal_statuses_have_no_transitions():
+    for status in TERMINAL_STATUSES:
+        assert status not in ORDER_TRANSITIONS
+
+
+def test_transition_sets_status_and_logs_change(orders):
+    oid = ObjectId()
+    orders.find_one.return_value = {"_id": oid, "status": "placed", "version": 0}
+    orders.find_one_and_update.return_value = {"_id": oid, "status": "accepted"}
+
+    transition_order(str(oid), "accepted")
+
+    guard, update = orders.find_one_and_update.call_args.args
+    assert guard == {"_id": oid, "status": "placed", "version": 0}
+    assert update["$set"]["status"] == "accepted"
+    assert update["$set"]["active"] is True
+    assert update["$set"]["version"] == 1
+    change = update["$push"]["status_history"]
+    assert (change["from_status"], change["to_status"], change["version"]) == ("placed", "accepted", 1)
+
+
+def test_transition_to_terminal_clears_active(orders):
+    oid = ObjectId()
+    orders.find_one.return_value = {"_id": oid, "status": "ready", "version": 3}
+    orders.find_one_and_update.return_value = {"_id": oid}
+
+    transition_order(str(oid), "served")
+
+    _, update = orders.find_one_and_update.call_args.args
+    assert update["$set"]["active"] is False
+    assert update["$set"]["version"] == 4
+
+
+def test_order_without_lifecycle_fields_is_treated_as_placed(orders):
+    oid = ObjectId()
+    orders.find_one.return_value = {"_id": oid}
+    orders.find_one_and_update.return_value = {"_id": oid}
+
+    transition_order(str(oid), "accepted")
+
+    guard, _ = orders.find_one_and_update.call_args.args
+    # None matches a missing field, so the guard still pins the unmigrated state
+    assert guard == {"_id": oid, "status": None, "version": None}
+
+
+@pytest.mark.parametrize("from_status,to_status", [
+    ("placed", "served"),
+    ("ready", "cancelled"),
+    ("served", "preparing"),
+    ("cancelled", "placed"),
+])
+def test_disallowed_transitions(orders, from_status, to_status):
+    orders.find_one.return_value = {"_id": ObjectId(), "status": from_status, "version": 0}
+    with pytest.raises(InvalidTransition):
+        transition_order(str(ObjectId()), to_status)
+    orders.find_one_and_update.assert_not_called()
+
+
+def test_stale_expected_version_is_rejected(orders):
+    orders.find_one.return_value = {"_id": ObjectId(), "status": "placed", "version": 2}
+    with pytest.raises(VersionConflict):
+        transition_order(str(ObjectId()), "accepted", expected_version=1)
+    orders.find_one_and_update.assert_not_called()
+
+
+def test_concurrent_update_is_a_conflict(orders):
+    orders.find_one.return_value = {"_id": ObjectId(), "status": "placed", "version": 0}
+    orders.find_one_and_update.return_value = None
+    with pytest.raises(VersionConflict):
+        transition_order(str(ObjectId()), "accepted")
+
+
+def test_missing_order(orders):
+    orders.find_one.return_value = None
+    with pytest.raises(OrderNotFound):
+        transition_order(str(ObjectId()), "accepted")
+
+
+@pytest.mark.parametrize("error,status_code", [
+    (OrderNotFound("x"), 404),
+    (InvalidTransition("x"), 400),
+    (VersionConflict("x"), 409),
+])
+def test_update_order_status_error_mapping(monkeypatch, error, status_code):
+    def fail(*args):
+        raise error
+
+    monkeypatch.setattr(main, "transition_order", fail)
+    req = main.UpdateOrderStatusRequest(status="accepted")
+    with pytest.raises(HTTPException) as exc:
+        main.update_order_status(str(ObjectId()), req)
+    assert exc.value.status_code == status_code
+
+
+def test_update_order_status_invalid_id():
+    req = main.UpdateOrderStatusRequest(status="accepted")
+    with pytest.raises(HTTPException) as exc:
+        main.update_order_status("not-an-id", req)
+    assert exc.value.status_code == 404
+
+
+def test_backfill_runs_once(monkeypatch):
+    orders, migrations = MagicMock(), MagicMock()
+    monkeypatch.setattr(order_lifecycle, "db", {
+        ORDER_COLLECTION: orders,
+        order_lifecycle.MIGRATION_COLLECTION: migrations,
+    })
+    migrations.find_one.return_value = None
+    orders.update_many.return_value.modified_count = 2
+
+    assert order_lifecycle.backfill_order_lifecycle() == 4
+    (_, live), (_, finished) = [c.args for c in orders.update_many.call_args_list]
+    assert live["$set"]["active"] is True
+    assert finished["$set"] == {"version": 0, "status_history": [], "status": "served", "active": False}
+    migrations.update_one.assert_called_once()
+
+    migrations.find_one.return_value = {"_id": order_lifecycle.BACKFILL_MIGRATION_ID}
+    orders.update_many.reset_mock()
+    assert order_lifecycle.backfill_order_lifecycle() == 0
+    orders.update_many.assert_not_called()